@@ -5,13 +5,21 @@
 Control bluetooth devices using albert
 """
 
+import functools
 import os
+import re
 from sqlite3 import connect
 import subprocess
-from typing import List
+import threading
+from typing import Dict, List, Tuple
 
 from albert import *
 
+try:
+    from pydbus import SystemBus
+except ImportError:
+    SystemBus = None
+
 md_iid = "2.3"
 md_version = "1.0"
 md_name = "Bluetooth"
@@ -21,35 +29,206 @@ md_url = "https://github.com/subtixx/albert-btctl"
 md_maintainers = "@subtixx"
 md_bin_dependencies = ["bluetoothctl"]
 
+_PLUGIN_DIR = os.path.dirname(__file__)
+_ICON_ACTIVE = _PLUGIN_DIR + '/bluetooth-active.svg'
+_ICON_DISABLED = _PLUGIN_DIR + '/bluetooth-disabled.svg'
+
+# Color codes emitted by bluetoothctl in interactive mode
+_RE_ANSI = re.compile(r'\x1b\[[0-9;]*m|\x01|\x02')
+
+# Prompts prefixed to lines in interactive mode, e.g. '[bluetooth]# '
+_RE_PROMPT = re.compile(r'^(?:\[[^\]]*\]# )+')
+
+# The only lines of 'bluetoothctl info' that are of interest
+_RE_INFO = re.compile(r'^\s*(Name|Connected|Icon):\s*(.*?)\s*$')
+
+# Seconds the background 'bluetoothctl info' query may take before it is abandoned
+_INFO_TIMEOUT = 10
+
+# Number of query strings whose matching devices are kept between index updates
+_QUERY_CACHE_SIZE = 32
+
+_BLUEZ_SERVICE = 'org.bluez'
+_BLUEZ_DEVICE_IFACE = 'org.bluez.Device1'
+
+_bus = None
+
+def _systemBus():
+    """
+    Opens the D-Bus system bus connection shared by the whole plugin.
+
+    Returns None if pydbus is not installed or the system bus can not be reached,
+    in which case bluetoothctl is used instead. Only a successful connection is kept,
+    so an unreachable bus is tried again on the next call.
+    """
+    global _bus
+    if _bus is None and SystemBus is not None:
+        try:
+            _bus = SystemBus()
+        except Exception:
+            pass
+    return _bus
+
+_btctlProcess : subprocess.Popen|None = None
+_btctlLock = threading.Lock()
+
+def _sendBluetoothctl(command, id, workingDir):
+    """
+    Sends a command (e.g. 'connect') for the given device ID to a bluetoothctl process that is kept
+    running for the lifetime of the plugin, without waiting for its output.
+
+    The process is started on first use and restarted if it has exited. If it can not be started or
+    written to, the command is run in a detached bluetoothctl process instead.
+    """
+    global _btctlProcess
+    with _btctlLock:
+        try:
+            if _btctlProcess is None or _btctlProcess.poll() is not None:
+                _btctlProcess = subprocess.Popen(
+                    ['bluetoothctl'],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    cwd=workingDir,
+                    text=True
+                )
+            _btctlProcess.stdin.write(command + ' ' + id + '\n')
+            _btctlProcess.stdin.flush()
+            return
+        except OSError:
+            _btctlProcess = None
+    runDetachedProcess(cmdln=['bluetoothctl', command, id], workdir=workingDir)
+
+def _closeBluetoothctl():
+    """
+    Stops the persistent bluetoothctl process started by `_sendBluetoothctl`, if it is running.
+    Closing its stdin makes bluetoothctl exit, it is terminated if it does not do so in time.
+    """
+    global _btctlProcess
+    with _btctlLock:
+        process, _btctlProcess = _btctlProcess, None
+    if process is None:
+        return
+    try:
+        process.stdin.close()
+    except OSError:
+        pass
+    try:
+        process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        process.terminate()
+        process.wait()
+
 class BluetoothDevice:
+    __slots__ = (
+        'id', 'name', 'icon', 'connected', 'dbusPath',
+        '_nameLower', '_connectText', '_disconnectText', '_iconUrls', '_rankItem',
+        '_connectAction', '_disconnectAction', '_connectedSerial'
+    )
+
     id: str
     name: str
     connected: bool
     icon: str|None # ex audio-headphones
+
+    # Incremented whenever the item of any device changes, lets callers tell if cached rank items are still valid
+    stateVersion: int = 0
+    # Guards the device state and everything derived from it, devices are updated from several threads
+    _stateLock = threading.RLock()
     
-    def __init__(self, id, name, icon=None, connected=False):
+    def __init__(self, id, name, icon=None, connected=False, dbusPath=None):
         self.id = id
-        self.name = name
-        self.icon = icon
         self.connected = connected
+        self._connectedSerial = 0
+        self.dbusPath = dbusPath
+        self._rankItem = None
+        self._connectAction = functools.partial(self.connect, _PLUGIN_DIR)
+        self._disconnectAction = functools.partial(self.disconnect, _PLUGIN_DIR)
+        self.setName(name)
+        self.setIcon(icon)
+
+    def setName(self, name):
+        self.name = name
+        self._nameLower = name.casefold()
+        self._connectText = 'Connect ' + name
+        self._disconnectText = 'Disconnect ' + name
+        self._invalidate()
+
+    def setIcon(self, icon):
+        with BluetoothDevice._stateLock:
+            self.icon = icon
+            self._recalcIcons()
+
+    def setConnected(self, connected):
+        with BluetoothDevice._stateLock:
+            # Counts every update, including ones that confirm the current state
+            self._connectedSerial += 1
+            if self.connected != connected:
+                self.connected = connected
+                self._recalcIcons()
+
+    def _recalcIcons(self):
+        self._iconUrls = [
+            self.getIcon(),
+            _ICON_ACTIVE if self.connected else _ICON_DISABLED
+        ]
+        self._invalidate()
+
+    def _invalidate(self):
+        with BluetoothDevice._stateLock:
+            BluetoothDevice.stateVersion += 1
+            self._rankItem = None
 
     def __str__(self):
         return self.name
     
+    def _callDbus(self, method, connected, serial):
+        # Connect/Disconnect block until bluez is done, so neither the proxy lookup nor the call may run on the caller's thread
+        threading.Thread(target=self._runDbus, args=(method, connected, serial), daemon=True).start()
+
+    def _runDbus(self, method, connected, serial):
+        try:
+            device = _systemBus().get(_BLUEZ_SERVICE, self.dbusPath)[_BLUEZ_DEVICE_IFACE]
+            getattr(device, method)()
+        except Exception as e:
+            warning(f'{method} {self.id} failed: {e}')
+            # A refresh may have set the real state while the call was pending, only undo our own optimistic update
+            with BluetoothDevice._stateLock:
+                if self._connectedSerial == serial:
+                    self.setConnected(not connected)
+
     def disconnect(self, workingDir):
         if not self.connected:
             return
-        runDetachedProcess(cmdln=['bluetoothctl', 'disconnect', self.id], workdir=workingDir)
-        self.connected = False
+        with BluetoothDevice._stateLock:
+            self.setConnected(False)
+            serial = self._connectedSerial
+        if self.dbusPath is not None:
+            self._callDbus('Disconnect', False, serial)
+        else:
+            _sendBluetoothctl('disconnect', self.id, workingDir)
 
     def connect(self, workingDir):
         if self.connected:
             return
-        runDetachedProcess(cmdln=['bluetoothctl', 'connect', self.id], workdir=workingDir)
-        self.connected = True
+        with BluetoothDevice._stateLock:
+            self.setConnected(True)
+            serial = self._connectedSerial
+        if self.dbusPath is not None:
+            self._callDbus('Connect', True, serial)
+        else:
+            _sendBluetoothctl('connect', self.id, workingDir)
         
     def rankItem(self) -> RankItem:
-        return RankItem(self.item(), 0.0 if self.connected else 1.0)
+        rankItem = self._rankItem
+        if rankItem is None:
+            version = BluetoothDevice.stateVersion
+            rankItem = RankItem(self.item(), 0.0 if self.connected else 1.0)
+            # Devices are updated from the refresh threads, only keep the item if nothing changed while it was built
+            with BluetoothDevice._stateLock:
+                if version == BluetoothDevice.stateVersion:
+                    self._rankItem = rankItem
+        return rankItem
     
     def getIcon(self) -> str:
         if self.icon is None or self.connected is False:
@@ -60,36 +239,34 @@ class BluetoothDevice:
     def item(self) -> StandardItem:
         return StandardItem(
             id=self.id,
-            text=(f'Connect' if not self.connected else f'Disconnect') + ' ' + self.name,
+            text=self._disconnectText if self.connected else self._connectText,
             subtext=self.id,
-            iconUrls=[
-                self.getIcon(),
-                os.path.dirname(__file__) + (f'/bluetooth-active.svg' if self.connected else '/bluetooth-disabled.svg')
-            ],
+            iconUrls=self._iconUrls,
             actions=[
                 Action(
                     id='connect',
                     text='Connect',
-                    callable=lambda: self.connect(os.path.dirname(__file__))
+                    callable=self._connectAction
                 ) if not self.connected else
                 Action(
                     id='disconnect',
                     text='Disconnect',
-                    callable=lambda: self.disconnect(os.path.dirname(__file__))
+                    callable=self._disconnectAction
                 )
             ]
         )
 
 class BluetoothControl:
     currentWorkingDir : str
+    _deviceCache : Dict[str, BluetoothDevice]
     
     def __init__(self):
         """
         Initializes the class instance with the current working directory.
 
         This method sets the `currentWorkingDir` attribute of the class instance
-        to the directory containing the current file. It uses the `os.path.dirname()`
-        function to get the directory name of the current file.
+        to the directory containing the current file. It also creates an
+        empty device cache holding the BluetoothDevice objects keyed by device ID.
 
         Parameters:
             None
@@ -97,7 +274,38 @@ class BluetoothControl:
         Returns:
             None
         """
-        self.currentWorkingDir = os.path.dirname(__file__)
+        self.currentWorkingDir = _PLUGIN_DIR
+        self._deviceCache = {}
+        self._pendingHydration = set()
+        self._hydrationLock = threading.Lock()
+        self._hydrationThread = None
+
+    def _parseInfo(self, id, lines) -> Tuple[str, str|None, bool]:
+        """
+        Parses the lines printed by 'bluetoothctl info' for a single device.
+
+        Parameters:
+            id (str): The ID of the Bluetooth device.
+            lines (Iterable[str]): The output lines belonging to that device.
+
+        Returns:
+            Tuple[str, str | None, bool]: The name, icon and connection state of the device.
+        """
+        name = 'Bluetooth Device ' + id
+        connected = False
+        icon = None
+        for line in lines:
+            m = _RE_INFO.match(line)
+            if not m:
+                continue
+            key, value = m.groups()
+            if key == 'Name':
+                name = value
+            elif key == 'Connected':
+                connected = value == 'yes'
+            else:
+                icon = value
+        return name, icon, connected
         
     def deviceInfo(self, id) -> BluetoothDevice:
         """
@@ -109,36 +317,167 @@ class BluetoothControl:
         Returns:
             BluetoothDevice: A BluetoothDevice object representing the device with the provided ID.
         """
-        proc = subprocess.run(['bluetoothctl', 'info', id], stdout=subprocess.PIPE)
-        name = 'Bluetooth Device ' + id
-        connected = False
-        icon = None
-        for x in proc.stdout.decode().splitlines():
-            currentLine = x.strip()
-            key, rawValue = currentLine.split(':', 1)
-            key = key.strip().lower()
-            value = rawValue.strip().lower()
-            if key == 'name':
-                name = rawValue.strip()
-            elif key == 'connected':
-                connected = value == 'yes'
-            elif key == 'icon':
-                icon = value
+        proc = subprocess.run(['bluetoothctl', 'info', id], stdout=subprocess.PIPE, encoding='utf-8', errors='replace')
+        name, icon, connected = self._parseInfo(id, proc.stdout.splitlines())
         return BluetoothDevice(id, name, icon, connected)
+
+    def _queryInfo(self, ids: List[str], timeout=None) -> Dict[str, Tuple[str, str|None, bool]]:
+        """
+        Retrieves information about several Bluetooth devices with a single bluetoothctl process.
+        All 'info <id>' commands are written to the stdin of one bluetoothctl instance and the
+        combined output is split on the 'Device <id>' header that starts every info block.
+        Devices without any info in the output (e.g. 'Device <id> not available') are left out of the result.
+
+        Parameters:
+            ids (List[str]): The IDs of the Bluetooth devices.
+            timeout (float | None): Seconds to wait for bluetoothctl, subprocess.TimeoutExpired is raised if exceeded.
+
+        Returns:
+            Dict[str, Tuple[str, str | None, bool]]: The name, icon and connection state keyed by device ID.
+        """
+        if not ids:
+            return {}
+
+        commands = ''.join('info ' + id + '\n' for id in ids) + 'quit\n'
+        proc = subprocess.run(['bluetoothctl'], input=commands, stdout=subprocess.PIPE, encoding='utf-8', errors='replace', timeout=timeout)
+
+        wanted = set(ids)
+        blocks : Dict[str, List[str]] = {id: [] for id in ids}
+        current = None
+        for x in _RE_ANSI.sub('', proc.stdout).splitlines():
+            currentLine = _RE_PROMPT.sub('', x).strip()
+            if currentLine.startswith('Device '):
+                headerId = currentLine[7:].split(' ', 1)[0]
+                current = headerId if headerId in wanted else None
+            elif current is not None:
+                blocks[current].append(currentLine)
+
+        return {
+            id: self._parseInfo(id, lines)
+            for id, lines in blocks.items()
+            if any(_RE_INFO.match(line) for line in lines)
+        }
         
+    def _hydrate(self, ids: List[str]):
+        """
+        Queries the info of the given devices and sets the icon of their cached BluetoothDevice objects.
+        Devices whose info could not be retrieved stay pending and are queried again on the next refresh.
+
+        Parameters:
+            ids (List[str]): The IDs of the Bluetooth devices.
+        """
+        try:
+            for id, (_, icon, _) in self._queryInfo(ids, timeout=_INFO_TIMEOUT).items():
+                with self._hydrationLock:
+                    self._pendingHydration.discard(id)
+                device = self._deviceCache.get(id)
+                if device is not None and icon is not None:
+                    device.setIcon(icon)
+        except Exception as e:
+            warning(f'Querying bluetooth device info failed: {e}')
+
+    def _startHydration(self, found):
+        with self._hydrationLock:
+            self._pendingHydration.intersection_update(found)
+            if not self._pendingHydration:
+                return
+            # A query that is still running covers its devices, the rest waits for the next refresh
+            if self._hydrationThread is not None and self._hydrationThread.is_alive():
+                return
+            self._hydrationThread = threading.Thread(target=self._hydrate, args=(list(self._pendingHydration),), daemon=True)
+            self._hydrationThread.start()
+
+    def _listDeviceIds(self, *filters) -> Dict[str, str]:
+        """
+        Runs 'bluetoothctl devices' with the given filter arguments (e.g. 'Connected').
+
+        Returns a dict mapping the ID of every listed device to its name.
+        """
+        found : Dict[str, str] = {}
+
+        proc = subprocess.run(['bluetoothctl', 'devices', *filters], stdout=subprocess.PIPE, encoding='utf-8', errors='replace')
+        for x in proc.stdout.splitlines():
+            if not x.startswith('Device '):
+                continue
+            id, name = x.removeprefix('Device ').split(' ', 1)
+            found[id] = name
+
+        return found
+
+    def _listDevicesDbus(self, bus) -> List[BluetoothDevice]:
+        """
+        Retrieves a list of paired Bluetooth devices with a single GetManagedObjects call on the bluez D-Bus service.
+        Name, connection state and icon are read from the org.bluez.Device1 properties of every device object,
+        the BluetoothDevice objects in the device cache are updated in place.
+
+        Returns a list of BluetoothDevice objects representing the available devices.
+        """
+        deviceList : List[BluetoothDevice] = []
+
+        objects = bus.get(_BLUEZ_SERVICE, '/').GetManagedObjects()
+        for path, interfaces in objects.items():
+            properties = interfaces.get(_BLUEZ_DEVICE_IFACE)
+            if properties is None or not properties.get('Paired', False):
+                continue
+            id = properties['Address']
+            name = properties.get('Alias') or properties.get('Name') or 'Bluetooth Device ' + id
+            device = self._deviceCache.get(id)
+            if device is None:
+                device = BluetoothDevice(id, name, dbusPath=path)
+            elif device.name != name:
+                device.setName(name)
+            if device.icon != properties.get('Icon'):
+                device.setIcon(properties.get('Icon'))
+            device.setConnected(bool(properties.get('Connected', False)))
+            device.dbusPath = path
+            deviceList.append(device)
+
+        self._deviceCache = {device.id: device for device in deviceList}
+
+        return deviceList
+
     def listDevices(self) -> List[BluetoothDevice]:
         """
-        Retrieves a list of Bluetooth devices by running 'bluetoothctl devices' command.
-        Parses the output to extract device ID and name, creates a new BluetoothDevice object for each device, and appends it to the deviceList.
+        Retrieves a list of paired Bluetooth devices from the bluez D-Bus service if pydbus is available, see `_listDevicesDbus`.
+        Otherwise, or if the D-Bus call fails, the list is retrieved by running 'bluetoothctl devices Paired' command.
+        Parses the output to extract device ID and name and looks up the BluetoothDevice object for each device in the device cache.
+        The connection state is taken from the output of 'bluetoothctl devices Connected'.
+        Devices seen for the first time are returned right away without an icon, their info is queried together
+        with a single bluetoothctl process in a background thread which fills in the icon once it is known.
+        Devices whose info query failed are queried again on the next call.
+        Devices no longer reported by bluetoothctl are dropped from the cache.
         
-        Returns a list of BluetoothDevice objects representing the available devices.
+        Returns a list of BluetoothDevice objects representing the paired devices.
         """
+        bus = _systemBus()
+        if bus is not None:
+            try:
+                return self._listDevicesDbus(bus)
+            except Exception as e:
+                warning(f'Listing devices over D-Bus failed, falling back to bluetoothctl: {e}')
+
         deviceList : List[BluetoothDevice] = []
         
-        proc = subprocess.run(['bluetoothctl', 'devices'], stdout=subprocess.PIPE)
-        for x in proc.stdout.decode().splitlines():
-            id, _ = x.removeprefix('Device ').split(' ', 1)
-            deviceList.append(self.deviceInfo(id))
+        found = self._listDeviceIds('Paired')
+        connected = self._listDeviceIds('Connected')
+
+        newIds = [id for id in found if id not in self._deviceCache]
+        for id in newIds:
+            self._deviceCache[id] = BluetoothDevice(id, found[id])
+        with self._hydrationLock:
+            self._pendingHydration.update(newIds)
+        self._startHydration(found)
+
+        for id in [id for id in self._deviceCache if id not in found]:
+            del self._deviceCache[id]
+
+        for id, name in found.items():
+            device = self._deviceCache[id]
+            if device.name != name:
+                device.setName(name)
+            device.setConnected(id in connected)
+            device.dbusPath = None
+            deviceList.append(device)
             
         return deviceList
     
@@ -151,9 +490,7 @@ class BluetoothControl:
         """
         deviceList : List[BluetoothDevice] = []
         
-        proc = subprocess.run(['bluetoothctl', 'devices', 'Connected'], stdout=subprocess.PIPE)
-        for x in proc.stdout.decode().splitlines():
-            id, _ = x.removeprefix('Device ').split(' ', 1)
+        for id in self._listDeviceIds('Connected'):
             deviceList.append(self.deviceInfo(id))
             
         return deviceList
@@ -168,14 +505,18 @@ class BluetoothControl:
         Returns:
             None
 
-        This function disconnects a Bluetooth device by running the 'bluetoothctl disconnect' command. It first checks if the `btDevice` argument is an instance of the `BluetoothDevice` class. If it is, it retrieves the device ID from the `id` attribute of the `btDevice` object. Otherwise, it assumes that the `btDevice` argument is a string representing the device ID. It then runs the 'bluetoothctl disconnect' command with the device ID as an argument. The working directory for the command is set to the `currentWorkingDir` attribute of the current instance.
+        This function disconnects a Bluetooth device by running the 'bluetoothctl disconnect' command. If the `btDevice` argument has a `disconnect` method it is treated as a BluetoothDevice object and disconnected directly. Otherwise, it is treated as a string representing the device ID, which is disconnected through its cached BluetoothDevice object if there is one, or by running the 'bluetoothctl disconnect' command with the device ID as an argument. The working directory for the command is set to the `currentWorkingDir` attribute of the current instance.
         """
-        if isinstance(btDevice, BluetoothDevice):
-            btDevice.disconnect(self.currentWorkingDir)
-        elif isinstance(btDevice, str):
-            runDetachedProcess(cmdln=['bluetoothctl', 'disconnect', btDevice], workdir=self.currentWorkingDir)
+        disconnect = getattr(btDevice, 'disconnect', None)
+        if disconnect is not None:
+            disconnect(self.currentWorkingDir)
+            return
+
+        device = self._deviceCache.get(btDevice)
+        if device is not None:
+            device.disconnect(self.currentWorkingDir)
         else:
-            raise TypeError('btDevice must be either a string or a BluetoothDevice object')
+            _sendBluetoothctl('disconnect', btDevice, self.currentWorkingDir)
         
     def connectDevice(self, btDevice: str|BluetoothDevice):
         """
@@ -187,50 +528,102 @@ class BluetoothControl:
         Returns:
             None
 
-        Raises:
-            TypeError: If the `btDevice` argument is neither a string nor a BluetoothDevice object.
-
-        This function connects a Bluetooth device by running the 'bluetoothctl connect' command. It first checks if the `btDevice` argument is an instance of the `BluetoothDevice` class. If it is, it retrieves the device ID from the `id` attribute of the `btDevice` object. Otherwise, it assumes that the `btDevice` argument is a string representing the device ID. It then runs the 'bluetoothctl connect' command with the device ID as an argument. The working directory for the command is set to the `currentWorkingDir` attribute of the current instance.
+        This function connects a Bluetooth device by running the 'bluetoothctl connect' command. If the `btDevice` argument has a `connect` method it is treated as a BluetoothDevice object and connected directly. Otherwise, it is treated as a string representing the device ID, which is connected through its cached BluetoothDevice object if there is one, or by running the 'bluetoothctl connect' command with the device ID as an argument. The working directory for the command is set to the `currentWorkingDir` attribute of the current instance.
 
         Note:
-            The `runDetachedProcess` function is used to run the 'bluetoothctl connect' command in a detached process.
+            The 'bluetoothctl connect' command is written to a persistent bluetoothctl process, see `_sendBluetoothctl`.
+            The `runDetachedProcess` function is only used if that process can not be started.
         """
-        if isinstance(btDevice, BluetoothDevice):
-            btDevice.connect(self.currentWorkingDir)
-        elif isinstance(btDevice, str):
-            runDetachedProcess(cmdln=['bluetoothctl', 'connect', btDevice], workdir=self.currentWorkingDir)
+        connect = getattr(btDevice, 'connect', None)
+        if connect is not None:
+            connect(self.currentWorkingDir)
+            return
+
+        device = self._deviceCache.get(btDevice)
+        if device is not None:
+            device.connect(self.currentWorkingDir)
         else:
-            raise TypeError('btDevice must be either a string or a BluetoothDevice object')
+            _sendBluetoothctl('connect', btDevice, self.currentWorkingDir)
 
 class Plugin(PluginInstance, IndexQueryHandler):
     bluetoothControl : BluetoothControl = BluetoothControl()
     bluetoothDevices : List[BluetoothDevice] = []
+    _queryCache : Dict[str, List[BluetoothDevice]]
+    _allRankItems : List[RankItem]|None
 
     def __init__(self):
         PluginInstance.__init__(self)
+        self._queryCache = {}
+        self._allRankItems = None
+        self._allRankItemsVersion = -1
+        self._indexLock = threading.Lock()
+        self._refreshLock = threading.Lock()
+        self._refreshing = False
+        self._refreshPending = False
         IndexQueryHandler.__init__(
             self,
             id='bt',
             name=md_name,
             description=md_description
         )
+
+    def finalize(self):
+        _closeBluetoothctl()
         
     def updateIndexItems(self):
-        self.bluetoothDevices = []
-        
-        devices = self.bluetoothControl.listDevices()
-        for device in devices:
-            self.bluetoothDevices.append(device)
+        # Querying the devices can take a while, keep serving the previous list until the refresh is done.
+        # A request arriving during a refresh makes the running refresh go once more instead of being dropped.
+        with self._refreshLock:
+            if self._refreshing:
+                self._refreshPending = True
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        while True:
+            try:
+                bluetoothDevices = self.bluetoothControl.listDevices()
+
+                with self._indexLock:
+                    self.bluetoothDevices = bluetoothDevices
+                    self._queryCache = {}
+                    self._allRankItems = None
+            except Exception as e:
+                warning(f'Refreshing bluetooth devices failed: {e}')
+
+            with self._refreshLock:
+                if not self._refreshPending:
+                    self._refreshing = False
+                    return
+                self._refreshPending = False
         
     def handleGlobalQuery(self, query: Query) -> List[RankItem]:
         if query.trigger == '':
             return []
         
-        filtered : List[RankItem] = []
-        
-        s = query.string.strip().lower()
-        for device in self.bluetoothDevices:
-            if not s or s in device.name.lower():
-                filtered.append(device.rankItem())
+        s = query.string.strip().casefold()
+        if not s:
+            return self._rankAll()
+
+        # Only the matching devices are cached, the rank items depend on the connection state which changes on every action
+        matches = self._queryCache.get(s)
+        if matches is None:
+            with self._indexLock:
+                matches = [device for device in self.bluetoothDevices if s in device._nameLower]
+                self._queryCache[s] = matches
+                # Every typed prefix is a new key, drop the oldest ones
+                if len(self._queryCache) > _QUERY_CACHE_SIZE:
+                    del self._queryCache[next(iter(self._queryCache))]
             
-        return filtered
+        return [device.rankItem() for device in matches]
+
+    def _rankAll(self) -> List[RankItem]:
+        # The list is shared between queries, Albert does not modify the returned items
+        allRankItems = self._allRankItems
+        if allRankItems is None or self._allRankItemsVersion != BluetoothDevice.stateVersion:
+            with self._indexLock:
+                self._allRankItemsVersion = BluetoothDevice.stateVersion
+                allRankItems = [device.rankItem() for device in self.bluetoothDevices]
+                self._allRankItems = allRankItems
+        return allRankItems